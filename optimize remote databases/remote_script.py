@@ -24,15 +24,16 @@
 #                                                                                    #
 # ================================================================================== #
 from argparse import ArgumentParser, Namespace
-from threading import Thread
-from queue import Queue
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from mysql.connector.pooling import MySQLConnectionPool
 import mysql.connector as mysql
 
 
 # ================================================================================== #
-ZERO_TIME = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 MAX_WORKERS = 30
+BATCH_SIZE = 64
+SHOW_TABLES = 'SHOW TABLES'
 CONFIG = dict(
     user='admin',
     password='admin',
@@ -44,94 +45,76 @@ CONFIG = dict(
 
 # ================================================================================== #
 class Optimizer:
-    workload = Queue()
-    results = Queue()
-    workers = list()
+    __slots__ = ('pool', 'max_workers')
 
     # ---------------------------------------------------------------------------------  #
-    @classmethod
-    def _worker(cls) -> None:
+    def __init__(self, pool: MySQLConnectionPool, max_workers: int) -> None:
         """
-        This method obtains database names from the workload Queue,
-        tries to optimize as many tables as it can in each database,
-        and saves the total work result into the results Queue.
-
-        :return: None
-        """
-        with mysql.connect(**CONFIG) as cnx:
-            with cnx.cursor(buffered=True) as cursor:
-                successes, failures = 0, 0
-                while bool(cls.workload.queue):
-                    db = cls.workload.get()
-                    cursor.execute(f'USE {db}')
-                    cursor.execute('SHOW TABLES')
-                    for table in cursor.fetchall():
-                        cursor.execute(f'OPTIMIZE TABLE {table[0]}')
-                        response = cursor.fetchall()
-                        if response[1][-1] == 'OK':
-                            successes += 1
-                        else:
-                            failures += 1
-                    cls.workload.task_done()
-                cls.results.put({
-                    'sc': successes,
-                    'fl': failures
-                })
-
-    # ---------------------------------------------------------------------------------- #
-    @classmethod
-    def init(cls) -> None:
-        """
-        This method inserts all found matching database
-        names into the workload and creates the
-        appropriate amount of worker threads.
-
-        :return: None
+        :param pool: Connection pool which the workers borrow connections from.
+        :param max_workers: Upper limit of concurrent worker threads.
         """
-        for db in databases:
-            cls.workload.put(db)
-        while True:
-            worker = Thread(target=cls._worker)
-            cls.workers.append(worker)
-            stop_cond = [
-                len(cls.workers) == len(cls.workload.queue),
-                len(cls.workers) == MAX_WORKERS
-            ].count(True)
-            if stop_cond:
-                break
+        self.pool = pool
+        self.max_workers = max_workers
 
     # ---------------------------------------------------------------------------------  #
-    @classmethod
-    def run(cls) -> None:
+    def _optimize_database(self, db: str) -> tuple:
         """
-        This method runs all worker threads and then
-        waits for them to finish processing.
-
-        :return: None
+        This method tries to optimize as many tables as it can
+        in the given database with batched multi-table OPTIMIZE
+        statements over a connection borrowed from the pool.
+        A MySQL error stops work on this database only: the tables
+        that were not reached are counted as failures.
+
+        :param db: Name of the database to optimize.
+        :return: Tuple of succeeded and failed table counts
+            and the error message or None
         """
-        for worker in cls.workers:
-            worker.start()
-        for worker in cls.workers:
-            worker.join()
+        successes, failures, done = 0, 0, 0
+        tables = list()
+        try:
+            cnx = self.pool.get_connection()
+            try:
+                with cnx.cursor(buffered=True) as cursor:
+                    #  Bound methods are looked up once, not once per table batch.
+                    execute, fetchall = cursor.execute, cursor.fetchall
+                    execute(f'USE {quote_identifier(db)}')
+                    execute(SHOW_TABLES)
+                    tables = [quote_identifier(row[0]) for row in fetchall()]
+                    for i in range(0, len(tables), BATCH_SIZE):
+                        batch = tables[i:i + BATCH_SIZE]
+                        execute('OPTIMIZE NO_WRITE_TO_BINLOG TABLE ' + ', '.join(batch))
+                        #  The server returns one 'status' row per table,
+                        #  which may be preceded by 'note' or 'error' rows.
+                        statuses = [
+                            row[3] for row in fetchall()
+                            if row[2] == 'status'
+                        ]
+                        ok = statuses.count('OK')
+                        successes += ok
+                        failures += len(statuses) - ok
+                        done = i + len(batch)
+            finally:
+                cnx.close()
+        except mysql.Error as err:
+            failures += len(tables) - done
+            return successes, failures, f'{db}: {err.msg}'
+        return successes, failures, None
 
     # ---------------------------------------------------------------------------------  #
-    @classmethod
-    def get_results(cls) -> dict:
+    def run(self, databases: tuple) -> dict:
         """
-        This method adds together all results in the
-        results Queue and returns the results total.
+        This method optimizes the given databases in a thread pool,
+        one database per worker at a time, and returns the results total.
 
-        :return: Total results of all databases
+        :param databases: Names of the databases to optimize.
+        :return: Total results and error messages of all databases
         """
-        successes, failures = 0, 0
-        while bool(cls.results.queue):
-            result = cls.results.get()
-            successes += result['sc']
-            failures += result['fl']
-            cls.results.task_done()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self._optimize_database, databases))
         return dict(
-            sc=successes,
-            fl=failures
+            sc=sum(result[0] for result in results),
+            fl=sum(result[1] for result in results),
+            errors=[result[2] for result in results if result[2]]
         )
 
 
@@ -150,20 +133,32 @@ def parse_cmdline_args() -> Namespace:
 
 
 # ---------------------------------------------------------------------------------  #
-def get_databases() -> list:
+def quote_identifier(name: str) -> str:
     """
-    Asks the MySQL server for database names matching the cmdline LIKE regex args.
+    Quotes a database or table name for use in a MySQL statement.
+    Identifiers cannot be bound as query parameters, so backticks
+    inside the name are escaped by doubling them instead.
 
-    :return: List of database names
+    :param name: Database or table name
+    :return: Backtick-quoted identifier
     """
-    dbs = list()
+    return '`' + name.replace('`', '``') + '`'
+
+
+# ---------------------------------------------------------------------------------  #
+def get_databases() -> tuple:
+    """
+    Asks the MySQL server for database names matching the cmdline LIKE regex args
+    with a single query, so that the patterns do not cost a round-trip each.
+
+    :return: Tuple of database names
+    """
+    query = 'SELECT schema_name FROM information_schema.schemata WHERE ' + \
+            ' OR '.join(['schema_name LIKE %s'] * len(args.db_names_like))
     with mysql.connect(**CONFIG) as cnx:
         with cnx.cursor(buffered=True) as cursor:
-            for name in args.db_names_like:
-                cursor.execute(f'SHOW DATABASES LIKE \'{name}\'')
-                for db in cursor.fetchall():
-                    dbs.append(db[0])
-    return dbs
+            cursor.execute(query, args.db_names_like)
+            return tuple(row[0] for row in cursor.fetchall())
 
 
 # ================================================================================== #
@@ -179,20 +174,27 @@ if __name__ == '__main__':
             print(f'{args.host} - Host would try to optimize '
                   f'-{len(databases)}- databases.')
         else:
-            start_time = datetime.now()
-            Optimizer.init()
-            Optimizer.run()
-            end_time = datetime.now()
-
-            diff = end_time - start_time
-            time_taken = ZERO_TIME + diff
-
-            results = Optimizer.get_results()
+            start_time = perf_counter()
+            results = dict(sc=0, fl=0, errors=[])
+            if databases:
+                #  The pool opens all of its connections up front,
+                #  so it is sized to the work that is actually there.
+                workers = min(len(databases), MAX_WORKERS)
+                pool = MySQLConnectionPool(
+                    pool_name='optimizer',
+                    pool_size=workers,
+                    **CONFIG
+                )
+                results = Optimizer(pool, workers).run(databases)
+            end_time = perf_counter()
+
+            mins, secs = divmod(int(end_time - start_time), 60)
+            for error in results['errors']:
+                print(f'{args.host} - ERROR! {error}')
             print(f'{args.host} - Optimization result: '
                   f'{results["sc"]}/{results["fl"]} tables '
                   f'succeeded/failed. Time taken: '
-                  f'{time_taken.minute} min : '
-                  f'{time_taken.second} sec')
+                  f'{mins} min : {secs} sec')
 
     except mysql.Error as err:
         print(f'{args.host} - ERROR! {err.msg}')
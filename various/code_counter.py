@@ -1,65 +1,194 @@
-from dotmap import DotMap
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+import json
+import mmap
+import os
+import re
+import stat
+import sys
+import tempfile
 
 
 # -------------------------------------------------------------------------------- #
 folders = ["rik_app", "tests", "scripts"]  # must be top-level
+wanted = frozenset(folders)
+ignored = {".git", ".venv", "venv", "__pycache__"}  # pruned from the walk
+# Lines end at \r\n, \r or \n, and whitespace is what str.strip() removes
+# from UTF-8 text, so that the counts match reading the files in text mode.
+line_start = rb"(?:\A|(?<=\n)|(?<=\r)(?!\n))"
+whitespace = rb"(?:[ \t\v\f\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80" \
+             rb"|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)"
+blank_regex = re.compile(line_start + whitespace + rb"*(?=[\r\n]|\Z)")
+comment_regex = re.compile(line_start + whitespace + rb"*#")
+newline_regex = re.compile(rb"\r\n?|\n")
+mmap_threshold = 2 * 1024 * 1024  # larger files are mapped instead of read
+max_workers = min(32, (os.cpu_count() or 1) * 4)  # file reads release the GIL
+cache_file = Path.home() / ".cache" / "code_counter.json"  # {project: {file: entry}}
+
+
+# -------------------------------------------------------------------------------- #
+@dataclass(slots=True)
+class Counts:
+    total_lines: int = 0
+    code_lines: int = 0
+    comment_lines: int = 0
+    blank_lines: int = 0
+
+    def __iadd__(self, other):
+        self.total_lines += other.total_lines
+        self.code_lines += other.code_lines
+        self.comment_lines += other.comment_lines
+        self.blank_lines += other.blank_lines
+        return self
 
 
 # -------------------------------------------------------------------------------- #
 def print_results(results, folder_name=None):
-    print('')
+    lines = ['']
     if folder_name:
-        print(f'Folder "{folder_name}" results:')
-        print('-' * 25)
+        lines.append(f'Folder "{folder_name}" results:')
+        lines.append('-' * 25)
     else:
-        print('\nTOTAL RESULTS:')
-        print('=' * 25)
-    print('Total lines:     ' + str(results.total_lines))
-    print('Code lines:      ' + str(results.code_lines))
-    print('Comment lines:   ' + str(results.comment_lines))
-    print('Blank lines:     ' + str(results.blank_lines))
+        lines.append('\nTOTAL RESULTS:')
+        lines.append('=' * 25)
+    lines.append('Total lines:     ' + str(results.total_lines))
+    lines.append('Code lines:      ' + str(results.code_lines))
+    lines.append('Comment lines:   ' + str(results.comment_lines))
+    lines.append('Blank lines:     ' + str(results.blank_lines))
     if not folder_name:
-        print()
+        lines.append('')
+    sys.stdout.write('\n'.join(lines) + '\n')
+
+
+# -------------------------------------------------------------------------------- #
+def collect_files(path) -> list:
+    files = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = [d for d in dirnames if d not in ignored]
+        for name in filenames:
+            if name.endswith('.py'):
+                files.append(os.path.join(dirpath, name))
+    return files
+
+
+# -------------------------------------------------------------------------------- #
+def count_file(path) -> tuple:
+    with open(path, 'rb', buffering=0) as f:
+        if os.fstat(f.fileno()).st_size > mmap_threshold:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return count_buffer(buf, len(newline_regex.findall(buf)))
+        buf = f.read()
+    return count_buffer(buf, buf.count(b"\n") + buf.count(b"\r") - buf.count(b"\r\n"))
 
 
 # -------------------------------------------------------------------------------- #
-def begin_walk(path) -> DotMap:
-    data = DotMap()
-    for item in path.iterdir():
-        if item.is_dir():
-            results = begin_walk(item)
-            for k, v in results.items():
-                data[k] += v
-        elif item.is_file() and item.suffix == '.py':
-            with open(item, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    line = line.strip()
-                    data.total_lines += 1
-                    if line == '':
-                        data.blank_lines += 1
-                    elif line.startswith("#"):
-                        data.comment_lines += 1
-                    else:
-                        data.code_lines += 1
-    return data
+def count_buffer(buf, newlines) -> tuple:
+    # The regex also matches the empty remainder after a
+    # trailing newline, which is not a line of its own.
+    ends_open = len(buf) > 0 and buf[-1:] not in (b"\n", b"\r")
+    total = newlines + ends_open
+    blank = len(blank_regex.findall(buf)) - (not ends_open)
+    comment = len(comment_regex.findall(buf))
+    return total, total - blank - comment, comment, blank
+
+
+# -------------------------------------------------------------------------------- #
+def load_cache() -> dict:
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+# -------------------------------------------------------------------------------- #
+def save_cache(cache):
+    # The cache is written to a temporary file and then renamed over the
+    # old one, so an interrupted or concurrent run never leaves it truncated.
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=cache_file.parent, suffix='.tmp')
+        try:
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+            os.replace(temp_path, cache_file)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except OSError:
+        pass
+
+
+# -------------------------------------------------------------------------------- #
+def is_valid_entry(entry) -> bool:
+    # Cache entries are [mtime_ns, size, total, code, comment, blank].
+    return isinstance(entry, list) and len(entry) == 6 and \
+        all(type(value) is int for value in entry)
+
+
+# -------------------------------------------------------------------------------- #
+def begin_walk(root, cache) -> tuple:
+    results, stale, entries = {}, {}, {}
+    with os.scandir(root) as it:
+        top = [entry for entry in it if entry.name in wanted and entry.is_dir()]
+    for entry in top:
+        counts = results[entry.name] = Counts()
+        for file in collect_files(entry.path):
+            # One stat per file: it also skips dangling symlinks,
+            # non-regular files and files deleted since the walk.
+            try:
+                st = os.stat(file)
+            except FileNotFoundError:
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            signature = [st.st_mtime_ns, st.st_size]
+            cached = cache.get(file)
+            if is_valid_entry(cached) and cached[:2] == signature:
+                entries[file] = cached
+                counts += Counts(*cached[2:])
+            else:
+                stale[file] = (entry.name, signature)
+    # Only the file reads are fanned out: directory listing is a chain of
+    # dependent syscalls that gains nothing from concurrency, so the walk
+    # above stays synchronous rather than async or threaded.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for file, lines in zip(stale, executor.map(count_file, stale)):
+            folder, signature = stale[file]
+            entries[file] = signature + list(lines)
+            results[folder] += Counts(*lines)
+    # Only files seen by this walk are kept, which drops the entries
+    # of deleted, renamed or ignored files of the project.
+    return results, entries
 
 
 # -------------------------------------------------------------------------------- #
 def find_pyproject_toml(path):
-    totals = DotMap()
-    if (path / "pyproject.toml").is_file():
-        for folder in folders:
-            results = begin_walk(path / folder)
-            for k, v in results.items():
-                totals[k] += v
-            print_results(results, folder)
-        print_results(totals)
-    elif path.parent != path:
-        find_pyproject_toml(path.parent)
-    else:
-        print("Unable to find pyproject.toml file! ", end='')
-        print("This script should be executed inside a Python project folder.")
+    while not (path / "pyproject.toml").is_file():
+        if path.parent == path:
+            print("Unable to find pyproject.toml file! ", end='')
+            print("This script should be executed inside a Python project folder.")
+            return
+        path = path.parent
+    cache = load_cache()
+    project = str(path)
+    entries = cache.get(project)
+    results, entries = begin_walk(path, entries if isinstance(entries, dict) else {})
+    totals = Counts()
+    for folder in folders:
+        if folder in results:
+            totals += results[folder]
+            print_results(results[folder], folder)
+    print_results(totals)
+    # Projects whose root directory no longer exists are dropped as well.
+    gone = [root for root in cache if root != project and not os.path.isdir(root)]
+    if gone or cache.get(project) != entries:
+        for root in gone:
+            del cache[root]
+        cache[project] = entries
+        save_cache(cache)
 
 
 # -------------------------------------------------------------------------------- #
@@ -24,10 +24,9 @@
 #                                                                                        #
 # ====================================================================================== #
 from typing import Union, Callable
-from pathlib import Path
-import traceback
+import functools
 import warnings
-import inspect
+import types
 
 
 warnings.filterwarnings('always', category=DeprecationWarning)
@@ -46,55 +45,55 @@ def deprecated(old_name: str, obj: DepType) -> DepType:
     """
 
     # -------------------------------------------------------- #
-    def warn(obj_type: str):
-        msg = f'\nWARNING! {obj_type} name \'{old_name}\' is ' \
-              f'deprecated! Replace it with \'{new_name}\'!'
-        tb = traceback.extract_stack()[0]
-        file = Path(tb.filename)
-        warnings.warn_explicit(
-            message=msg,
-            category=DeprecationWarning,
-            filename=file.name,
-            lineno=tb.lineno
-        )
+    def warn(msg: str):
+        # stacklevel=3 skips this function and the getter, setter,
+        # deleter, wrapper or __init__ frame, so that the warning
+        # points at the caller which still uses the old name.
+        warnings.warn(msg, DeprecationWarning, stacklevel=3)
+
+    def message(obj_type: str, new_name: str) -> str:
+        return f'\nWARNING! {obj_type} name \'{old_name}\' is ' \
+               f'deprecated! Replace it with \'{new_name}\'!'
 
     # -------------------------------------------------------- #
     if isinstance(obj, property):
-        new_name = obj.fget.__name__
+        msg = message('Property', obj.fget.__name__)
 
         def getter(self):
-            warn(obj_type='Property')
+            warn(msg)
             return obj.fget(self)
 
         def setter(self, value):
-            warn(obj_type='Property')
+            warn(msg)
             obj.fset(self, value)
 
         def deleter(self):
-            warn(obj_type='Property')
+            warn(msg)
             obj.fdel(self)
 
         return property(getter, setter, deleter)
 
     # -------------------------------------------------------- #
-    elif inspect.isfunction(obj):
-        new_name = obj.__name__
+    elif isinstance(obj, types.FunctionType):
+        msg = message('Function', obj.__name__)
 
+        @functools.wraps(obj)
         def wrapper(*args, **kwargs):
-            warn(obj_type='Function')
+            warn(msg)
             return obj(*args, **kwargs)
 
         return wrapper
 
     # -------------------------------------------------------- #
-    elif inspect.isclass(obj):
-        new_name = obj.__name__
+    elif isinstance(obj, type):
+        msg = message('Class', obj.__name__)
 
         class Wrapper(obj):
             def __init__(self, *args, **kwargs):
-                warn(obj_type='Class')
+                warn(msg)
                 super().__init__(*args, **kwargs)
 
+        functools.update_wrapper(Wrapper, obj, updated=())
         return Wrapper
 
     # -------------------------------------------------------- #